@@ -1,18 +1,63 @@
-import time
 import os
+import logging
+import sys
+import queue
+import signal
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from dotenv import load_dotenv
-from watchdog.observers import Observer
+# Use the OS-native notification API explicitly instead of relying on auto-detection
+try:
+    if sys.platform.startswith("linux"):
+        from watchdog.observers.inotify import InotifyObserver as Observer
+    elif sys.platform == "darwin":
+        try:
+            from watchdog.observers.fsevents import FSEventsObserver as Observer
+        except Exception:
+            from watchdog.observers.kqueue import KqueueObserver as Observer
+    elif sys.platform == "win32":
+        from watchdog.observers.read_directory_changes import WindowsApiObserver as Observer
+    else:
+        from watchdog.observers.polling import PollingObserver as Observer
+except Exception:
+    # Not only ImportError: inotify raises UnsupportedLibcError on a libc without it
+    from watchdog.observers.polling import PollingObserver as Observer
 from watchdog.events import FileSystemEventHandler
 from webdav3.client import Client
 
 LOCAL_DIR = Path("./HetznerDrive").resolve()
 REMOTE_DIR = "/HetznerDrive"
 
+# Log file, written by a background thread so event handlers never block on I/O
+LOG_FILE = Path("./hetzner_drive_changes.log").resolve()
+
+logger = logging.getLogger(__name__)
+
+# How long the observer threads block on their queues between checks for stop() (watchdog
+# defaults to 1 s); events are dispatched as soon as they arrive. PollingObserver uses the
+# timeout as its scan interval instead, so it keeps the default.
+OBSERVER_TIMEOUT = 0.5
+
 # Load environment variables from .env file
 load_dotenv()
 
 # --- Helpers -----------------------------------------------------------------
+def setup_logging():
+    """Send log records through a queue to file and console handlers running on a listener thread"""
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+    handlers = [RotatingFileHandler(LOG_FILE, maxBytes=10 << 20, backupCount=3, encoding="utf-8")]
+    if os.getenv("HETZNER_LOG_CONSOLE", "1") != "0":
+        handlers.append(logging.StreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    # The queue handler only merges the arguments, the listener handlers apply the real format
+    logging.basicConfig(level=logging.INFO, format="%(message)s", handlers=[QueueHandler(log_queue)])
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
 def load_config():
     """Load configuration from environment variables"""
     # Convert to webdavclient3 format
@@ -30,107 +75,145 @@ def create_webdav_client(config_options):
     client.verify = True
     return client
 
+def check_inotify_limit():
+    """Warn when the local tree needs nearly as many inotify watches as the kernel allows"""
+    try:
+        with open("/proc/sys/fs/inotify/max_user_watches") as f:
+            max_watches = int(f.read())
+    except (OSError, ValueError):
+        # Not Linux, or the limit can't be read
+        return
+    # inotify needs one watch per directory
+    watched_dirs = sum(1 for _ in os.walk(LOCAL_DIR))
+    if watched_dirs > max_watches * 0.9:
+        logger.warning("%s directories to watch, close to the inotify limit of %s", watched_dirs, max_watches)
+        logger.warning("Raise it with: sudo sysctl fs.inotify.max_user_watches=<value>")
+
 # --- Watchdog Local Event Handler --------------------------------------------
 class LocalHandler(FileSystemEventHandler):
     def __init__(self, client):
         self.client = client
+        # Event paths are always below LOCAL_DIR, so the relative part is a plain slice
+        self._local_prefix_len = len(str(LOCAL_DIR)) + 1
+
+    def _rel_path(self, src):
+        return src[self._local_prefix_len:].replace(os.sep, "/")
+
+    def _remote_path(self, src):
+        return f"{REMOTE_DIR}/{self._rel_path(src)}"
 
     def on_modified(self, event):
         if not event.is_directory:
             try:
-                self.upload(Path(event.src_path))
+                self.upload(event.src_path)
             except Exception as e:
-                print(f"Error handling file modification for {event.src_path}: {e}")
+                logger.error("Error handling file modification for %s: %s", event.src_path, e)
 
     def on_moved(self, event):
         try:
-            rel_source = str(Path(event.src_path).relative_to(LOCAL_DIR))
-            remote_path_source = f"{REMOTE_DIR}/{rel_source}".replace("\\", "/")
-            rel_dest = str(Path(event.dest_path).relative_to(LOCAL_DIR))
-            remote_path_dest = f"{REMOTE_DIR}/{rel_dest}".replace("\\", "/")
-            print(f"Moving {rel_source} to {rel_dest}")
+            remote_path_source = self._remote_path(event.src_path)
+            remote_path_dest = self._remote_path(event.dest_path)
+            logger.info("Moving %s to %s", self._rel_path(event.src_path), self._rel_path(event.dest_path))
             self.client.move(remote_path_source, remote_path_dest)
-            print(f"Moved {remote_path_source} to {remote_path_dest}")
+            logger.info("Moved %s to %s", remote_path_source, remote_path_dest)
         except Exception as e:
-            print(f"Error handling file move for {remote_path_source}: {e}")
+            logger.error("Error handling file move for %s: %s", event.src_path, e)
 
     def on_created(self, event):
         if not event.is_directory:
             try:
-                self.upload(Path(event.src_path))
+                self.upload(event.src_path)
             except Exception as e:
-                print(f"Error handling file creation for {event.src_path}: {e}")
+                logger.error("Error handling file creation for %s: %s", event.src_path, e)
         else:
             try:
-                rel = str(Path(event.src_path).relative_to(LOCAL_DIR))
-                remote_path = f"{REMOTE_DIR}/{rel}".replace("\\", "/")
+                remote_path = self._remote_path(event.src_path)
                 self.client.mkdir(remote_path)
-                print(f"Created remote directory: {remote_path}")
+                logger.info("Created remote directory: %s", remote_path)
             except Exception as e:
-                print(f"Error handling directory creation for {event.src_path}: {e}")
+                logger.error("Error handling directory creation for %s: %s", event.src_path, e)
 
     def on_deleted(self, event):
         if not event.is_directory:
             try:
-                rel = str(Path(event.src_path).relative_to(LOCAL_DIR))
-                remote_path = f"{REMOTE_DIR}/{rel}".replace("\\", "/")
-                self.client.clean(remote_path)
-                print(f"Deleted remote: {rel}")
+                rel = self._rel_path(event.src_path)
+                self.client.clean(self._remote_path(event.src_path))
+                logger.info("Deleted remote: %s", rel)
             except Exception as e:
-                print(f"Error handling file deletion for {event.src_path}: {e}")
+                logger.error("Error handling file deletion for %s: %s", event.src_path, e)
 
-    def upload(self, path: Path):
+    def upload(self, src):
         try:
-            rel = str(path.relative_to(LOCAL_DIR)).replace("\\", "/")
-            remote_path = f"{REMOTE_DIR}/{rel}"
-            print(f"Uploading {rel} -> {remote_path}")
-            self.client.upload_sync(remote_path=remote_path, local_path=str(path))
-            print(f"Successfully uploaded: {rel}")
+            rel = self._rel_path(src)
+            remote_path = self._remote_path(src)
+            logger.info("Uploading %s -> %s", rel, remote_path)
+            self.client.upload_sync(remote_path=remote_path, local_path=src)
+            logger.info("Successfully uploaded: %s", rel)
         except Exception as e:
-            print(f"Error uploading {path}: {e}")
+            logger.error("Error uploading %s: %s", src, e)
             # Don't re-raise - we want to continue monitoring other files
 
 # --- Main Sync Loop ----------------------------------------------------------
 def main():
+    log_listener = setup_logging()
     try:
         config_options = load_config()
         client = create_webdav_client(config_options)
 
-        print(f"Local directory: {LOCAL_DIR}")
-        print(f"Remote directory: {REMOTE_DIR}")
+        logger.info("Local directory: %s", LOCAL_DIR)
+        logger.info("Remote directory: %s", REMOTE_DIR)
         
         LOCAL_DIR.mkdir(exist_ok=True)
         
         # Ensure remote base directory exists
         try:
-            print(f"Ensuring remote directory exists: {REMOTE_DIR}")
+            logger.info("Ensuring remote directory exists: %s", REMOTE_DIR)
             client.mkdir(REMOTE_DIR)
         except Exception as e:
-            print(f"Warning: Could not create remote directory {REMOTE_DIR}: {e}")
-            print("This might be normal if the directory already exists or if you don't have write permissions")
+            logger.warning("Could not create remote directory %s: %s", REMOTE_DIR, e)
+            logger.info("This might be normal if the directory already exists or if you don't have write permissions")
 
         # Start local watcher
         handler = LocalHandler(client)
-        obs = Observer()
+        if Observer.__name__ == "PollingObserver":
+            logger.warning("Native file system events are unavailable, falling back to polling")
+            obs = Observer()
+        else:
+            obs = Observer(timeout=OBSERVER_TIMEOUT)
+        check_inotify_limit()
         obs.schedule(handler, str(LOCAL_DIR), recursive=True)
         obs.start()
 
-        print("Starting file sync (Ctrl+C to stop)...")
-        try:
-            while True:
-                time.sleep(30)
-        except KeyboardInterrupt:
-            print("\nStopping sync...")
+        stopping = []
+
+        def stop(signum, frame):
+            if stopping:
+                # Second signal: exit without waiting for queued operations
+                raise KeyboardInterrupt
+            stopping.append(signum)
+            logger.info("Stopping sync...")
             obs.stop()
+
+        # Ctrl+C and SIGTERM stop the observer; until then the main thread just waits on it
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        logger.info("Starting file sync (Ctrl+C to stop)...")
+        try:
+            # Join with a timeout so signals are also handled where a blocking join can't be interrupted (Windows)
+            while obs.is_alive():
+                obs.join(1)
         finally:
-            obs.join()
-            print("Sync stopped.")
+            logger.info("Sync stopped.")
             
+    except KeyboardInterrupt:
+        logger.warning("Sync interrupted")
+        return 1
     except Exception as e:
-        print(f"Fatal error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Fatal error: %s", e)
         return 1
+    finally:
+        log_listener.stop()
     
     return 0
 
@@ -1,19 +1,138 @@
 import time
 import os
+import asyncio
+import logging
+import sys
+import json
+import mmap
+import queue
+import signal
+import threading
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from urllib.parse import unquote, urlparse
+import aiohttp
+import urllib3
+import xxhash
 from dotenv import load_dotenv
-from watchdog.observers import Observer
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+# Use the OS-native notification API explicitly instead of relying on auto-detection
+try:
+    if sys.platform.startswith("linux"):
+        from watchdog.observers.inotify import InotifyObserver as Observer
+    elif sys.platform == "darwin":
+        try:
+            from watchdog.observers.fsevents import FSEventsObserver as Observer
+        except Exception:
+            from watchdog.observers.kqueue import KqueueObserver as Observer
+    elif sys.platform == "win32":
+        from watchdog.observers.read_directory_changes import WindowsApiObserver as Observer
+    else:
+        from watchdog.observers.polling import PollingObserver as Observer
+except Exception:
+    # Not only ImportError: inotify raises UnsupportedLibcError on a libc without it
+    from watchdog.observers.polling import PollingObserver as Observer
 from watchdog.events import FileSystemEventHandler
 from webdav3.client import Client
+from webdav3.exceptions import MethodNotSupported, RemoteResourceNotFound, ResponseErrorCode
+from webdav3.urn import Urn
 
 LOCAL_DIR = Path("./HetznerDrive").resolve()
 REMOTE_DIR = "/HetznerDrive"
 
+# Log file, written by a background thread so event handlers never block on I/O
+LOG_FILE = Path("./hetzner_drive_sync.log").resolve()
+
+logger = logging.getLogger(__name__)
+
+# How long the observer threads block on their queues between checks for stop() (watchdog
+# defaults to 1 s); events are dispatched as soon as they arrive. PollingObserver uses the
+# timeout as its scan interval instead, so it keeps the default.
+OBSERVER_TIMEOUT = 0.5
+
+# Quiet period used to coalesce bursts of events for the same path
+DEBOUNCE_SECONDS = 0.3
+
+# Uploads of an unchanged (path, size, mtime) within this window are skipped, e.g. editor re-saves
+RECENT_UPLOAD_SECONDS = 2.0
+RECENT_UPLOAD_MAX = 1024
+
+# How long after a directory move the per-child move events watchdog generates for it are dropped
+SUB_MOVE_SECONDS = 10.0
+
+# Local state of previously uploaded files, used to skip uploads of unchanged content
+INDEX_FILE = LOCAL_DIR / ".hetzner_sync_index.json"
+
+# Append-only log of remote operations done since the index was last written
+JOURNAL_FILE = LOCAL_DIR / ".hetzner_sync_journal.log"
+
+# Files larger than this are uploaded as parallel ranged PUTs that can be resumed
+CHUNKED_UPLOAD_THRESHOLD = 64 << 20
+CHUNK_SIZE = 8 << 20
+CHUNK_WORKERS = 4
+
+# Files smaller than this are hashed with one read() into a reused buffer, larger ones through mmap
+SMALL_FILE_READ_SIZE = 1 << 20
+
+# Size of the writes used to stream a file body to the socket (urllib3 defaults to 16 KiB)
+UPLOAD_BLOCK_SIZE = 1 << 20
+
+# Bookkeeping files inside LOCAL_DIR that are never synced
+IGNORED_PATHS = {str(INDEX_FILE), f"{INDEX_FILE}.tmp", str(JOURNAL_FILE)}
+
 # Load environment variables from .env file
 load_dotenv()
 
+# Maximum number of concurrent requests issued against the storage box
+CONCURRENCY = int(os.getenv("HETZNER_CONCURRENCY", "8"))
+
+# Maximum number of in-flight uploads/deletes during the initial sync, which runs them on one event loop
+ASYNC_CONCURRENCY = int(os.getenv("HETZNER_ASYNC_CONCURRENCY", "64"))
+
+# Compare the whole local and remote trees at startup even if the index says they are in sync
+FULL_SYNC = os.getenv("HETZNER_FULL_SYNC", "0") == "1"
+
+# Per-thread WebDAV clients used by the worker pools
+_thread_local = threading.local()
+
+# Guards the in-memory sync index shared by the upload threads
+_index_lock = threading.Lock()
+
+# Serializes journal appends and compaction
+_journal_lock = threading.Lock()
+
+# PROPFIND body requesting only the properties needed to compare trees
+PROPFIND_BODY = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<D:propfind xmlns:D="DAV:"><D:prop>'
+    '<D:getlastmodified/><D:getcontentlength/><D:getetag/><D:resourcetype/>'
+    '</D:prop></D:propfind>'
+)
+
 # --- Helpers -----------------------------------------------------------------
 
+def setup_logging():
+    """Send log records through a queue to file and console handlers running on a listener thread"""
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+    handlers = [RotatingFileHandler(LOG_FILE, maxBytes=10 << 20, backupCount=3, encoding="utf-8")]
+    if os.getenv("HETZNER_LOG_CONSOLE", "1") != "0":
+        handlers.append(logging.StreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    # The queue handler only merges the arguments, the listener handlers apply the real format
+    logging.basicConfig(level=logging.INFO, format="%(message)s", handlers=[QueueHandler(log_queue)])
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
 def load_config():
     """Load configuration from environment variables"""
     # Convert to webdavclient3 format
@@ -25,250 +144,1087 @@ def load_config():
     }
     return options
 
+class UploadAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections send file bodies in UPLOAD_BLOCK_SIZE writes"""
+    def init_poolmanager(self, *args, **kwargs):
+        # urllib3 1.x rejects blocksize as a pool key, it keeps its default writes there
+        if int(urllib3.__version__.split(".")[0]) >= 2:
+            kwargs["blocksize"] = UPLOAD_BLOCK_SIZE
+        super().init_poolmanager(*args, **kwargs)
+
 def create_webdav_client(config_options):
     """Create and configure WebDAV client"""
     client = Client(config_options)
     client.verify = True
+    # Keep TLS connections alive between requests and retry transient server errors
+    retries = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"PROPFIND"},
+    )
+    adapter = UploadAdapter(pool_connections=CONCURRENCY, pool_maxsize=CONCURRENCY, max_retries=retries)
+    client.session.mount("https://", adapter)
+    client.session.mount("http://", adapter)
+    return client
+
+def parse_http_date(value):
+    """Convert an HTTP date (as used by getlastmodified) to a POSIX timestamp"""
+    return parsedate_to_datetime(value).timestamp()
+
+def normalize_etag(value):
+    """Strip the weak marker and quotes so ETag headers and getetag values compare equal"""
+    if not value:
+        return None
+    if value.startswith("W/"):
+        value = value[2:]
+    return value.strip('"')
+
+def load_index():
+    """Load the sync index: {"complete", "dirs", "files": {rel_path: {"dev", "ino", "size", "mtime_ns", "xxh3", "etag"}}}
+
+    "complete" means files and dirs mirror the remote tree, so the next startup
+    only needs to look at local changes instead of listing the whole server.
+    "dev" and "ino" are only present when "xxh3" is the hash of that local file.
+    """
+    index = {"complete": False, "dirs": set(), "files": {}}
+    try:
+        with open(INDEX_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if "files" in data:
+            index.update(data)
+            index["dirs"] = set(data["dirs"])
+        else:
+            # Older index holding only the file entries
+            index["files"] = data
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("Could not read sync index %s: %s", INDEX_FILE, e)
+    return index
+
+def save_index(index):
+    """Atomically write the sync index"""
+    tmp_path = f"{INDEX_FILE}.tmp"
+    with _index_lock:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(dict(index, dirs=sorted(index["dirs"])), f)
+        os.replace(tmp_path, INDEX_FILE)
+
+def append_journal(op, rel, **fields):
+    """Durably record a remote operation that has completed"""
+    line = json.dumps(dict(fields, op=op, rel=rel))
+    with _journal_lock:
+        with open(JOURNAL_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+def replay_journal(index):
+    """Apply the journaled operations on top of the index"""
+    try:
+        with open(JOURNAL_FILE, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return
+    with _index_lock:
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn write from a crash
+                continue
+            apply_journal_record(index, record.pop("op"), record.pop("rel"), record)
+
+def apply_journal_record(index, op, rel, record):
+    """Apply a single journaled operation to the index (caller holds _index_lock)"""
+    files = index["files"]
+    dirs = index["dirs"]
+    if op in ("upload", "download"):
+        files[rel] = record
+        parent = rel.rpartition("/")[0]
+        while parent:
+            dirs.add(parent)
+            parent = parent.rpartition("/")[0]
+    elif op == "partial":
+        if record["offset"] is None:
+            files.get(rel, {}).pop("partial", None)
+        else:
+            files.setdefault(rel, {})["partial"] = record
+    elif op == "delete":
+        files.pop(rel, None)
+    elif op == "mkdir":
+        dirs.add(rel)
+    elif op == "move":
+        dest = record["dest"]
+        if rel in files:
+            files[dest] = files.pop(rel)
+            return
+        # Directory move: re-key everything below it
+        prefix = rel + "/"
+        for key in [key for key in files if key.startswith(prefix)]:
+            files[dest + key[len(rel):]] = files.pop(key)
+        for key in [key for key in dirs if key == rel or key.startswith(prefix)]:
+            dirs.discard(key)
+            dirs.add(dest + key[len(rel):])
+
+def compact_journal(index):
+    """Write the index (which must already include the journal) and start an empty journal"""
+    with _journal_lock:
+        save_index(index)
+        try:
+            os.remove(JOURNAL_FILE)
+        except FileNotFoundError:
+            pass
+
+def hash_file(path, size):
+    """Return the xxh3-64 hex digest of a local file"""
+    if size < SMALL_FILE_READ_SIZE:
+        # Small files: open, a single read into this thread's reusable buffer, close
+        buf = getattr(_thread_local, "read_buffer", None)
+        if buf is None:
+            buf = _thread_local.read_buffer = bytearray(SMALL_FILE_READ_SIZE)
+        with open(path, "rb", buffering=0) as f:
+            n = f.readinto(buf)
+        if n < SMALL_FILE_READ_SIZE:
+            return xxhash.xxh3_64_hexdigest(memoryview(buf)[:n])
+        # The file grew since it was stat'ed, hash all of it below
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return xxhash.xxh3_64_hexdigest(mm)
+
+def put_file(client, remote_path, local_path, if_match=None):
+    """Upload a file with a single PUT and return the ETag the server assigned to it.
+
+    With if_match, the server refuses the upload (412) if the remote file no longer has that ETag.
+    """
+    headers = [f'If-Match: "{if_match}"'] if if_match else None
+    with open(local_path, "rb") as f:
+        response = client.execute_request(
+            action="upload", path=Urn(remote_path).quote(), data=f, headers_ext=headers
+        )
+    etag = response.headers.get("ETag")
+    response.close()
+    if not etag:
+        etag = client.info(remote_path).get("etag")
+    return normalize_etag(etag)
+
+def get_file(client, remote_path, local_path):
+    """Download a file, returning the ETag of the downloaded version and the xxh3-64 digest of its content"""
+    digest = xxhash.xxh3_64()
+    response = client.execute_request(action="download", path=Urn(remote_path).quote())
+    try:
+        with open(local_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=UPLOAD_BLOCK_SIZE):
+                f.write(chunk)
+                digest.update(chunk)
+    finally:
+        response.close()
+    etag = response.headers.get("ETag") or client.info(remote_path).get("etag")
+    return normalize_etag(etag), digest.hexdigest()
+
+def chunked_upload(client, remote_path, local_path, index, rel, chunk_size=CHUNK_SIZE):
+    """Upload a large file as parallel Content-Range PUTs and return its ETag.
+
+    The first contiguous byte offset confirmed by the server is journaled and kept under
+    index["files"][rel]["partial"], so an interrupted upload of an unchanged file
+    resumes from there. Falls back to a single PUT if the server rejects ranged uploads.
+    """
+    files = index["files"]
+    local_stat = os.stat(local_path)
+    total = local_stat.st_size
+    url = client.get_url(Urn(remote_path).quote())
+
+    def put_chunk(start):
+        end = min(start + chunk_size, total) - 1
+        with open(local_path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start + 1)
+        return client.session.put(
+            url,
+            data=data,
+            auth=(client.webdav.login, client.webdav.password),
+            headers={"Content-Range": f"bytes {start}-{end}/{total}"},
+            timeout=client.timeout,
+            verify=client.verify,
+        )
+
+    def record(offset):
+        # Journaled rather than rewriting the whole index for every chunk
+        fields = {"size": total, "mtime_ns": local_stat.st_mtime_ns, "offset": offset}
+        append_journal("partial", rel, **fields)
+        with _index_lock:
+            apply_journal_record(index, "partial", rel, fields)
+
+    offset = 0
+    with _index_lock:
+        partial = files.get(rel, {}).get("partial")
+    if partial and partial["size"] == total and partial["mtime_ns"] == local_stat.st_mtime_ns:
+        offset = partial["offset"]
+        logger.info("Resuming upload of %s at byte %s", rel, offset)
+    else:
+        # The first chunk creates the file, the rest can then be written in parallel
+        response = put_chunk(0)
+        response.close()
+        if response.status_code in (400, 405, 501):
+            logger.info("Server rejected ranged upload, uploading %s in one request", rel)
+            return put_file(client, remote_path, local_path)
+        response.raise_for_status()
+        offset = min(chunk_size, total)
+        record(offset)
+
+    def send(start):
+        response = put_chunk(start)
+        response.close()
+        response.raise_for_status()
+        return min(start + chunk_size, total)
+
+    # map() yields in submission order, so every result extends the contiguous prefix
+    with ThreadPoolExecutor(max_workers=CHUNK_WORKERS) as executor:
+        for done in executor.map(send, range(offset, total, chunk_size)):
+            record(done)
+
+    remote_info = client.info(remote_path)
+    record(None)
+    if int(remote_info.get("size") or 0) != total:
+        # Server accepted the requests but ignored Content-Range
+        logger.info("Remote size mismatch after ranged upload, uploading %s in one request", rel)
+        return put_file(client, remote_path, local_path)
+    return normalize_etag(remote_info.get("etag"))
+
+def get_thread_client(config_options):
+    """Return the WebDAV client owned by the calling thread, creating it on first use"""
+    client = getattr(_thread_local, "client", None)
+    if client is None:
+        client = create_webdav_client(config_options)
+        _thread_local.client = client
     return client
 
+def check_inotify_limit():
+    """Warn when the local tree needs nearly as many inotify watches as the kernel allows"""
+    try:
+        with open("/proc/sys/fs/inotify/max_user_watches") as f:
+            max_watches = int(f.read())
+    except (OSError, ValueError):
+        # Not Linux, or the limit can't be read
+        return
+    # inotify needs one watch per directory
+    watched_dirs = sum(1 for _ in os.walk(LOCAL_DIR))
+    if watched_dirs > max_watches * 0.9:
+        logger.warning("%s directories to watch, close to the inotify limit of %s", watched_dirs, max_watches)
+        logger.warning("Raise it with: sudo sysctl fs.inotify.max_user_watches=<value>")
+
 # --- Watchdog Local Event Handler --------------------------------------------
 
 class LocalHandler(FileSystemEventHandler):
-    def __init__(self, client):
-        self.client = client
+    def __init__(self, config_options):
+        self.config_options = config_options
+        # Event paths are always below LOCAL_DIR, so the relative part is a plain slice
+        self._local_prefix_len = len(str(LOCAL_DIR)) + 1
+        # Last known remote state (ETags, resume offsets of chunked uploads), kept current with the journal
+        self.index = load_index()
+        replay_journal(self.index)
+        # Pending debounced operations, keyed by absolute local path
+        self._timers = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Local paths renamed by a conflict, whose move event must not be synced
+        self._conflict_renames = set()
+        # Destination path -> Event set once the queued move into it has run
+        self._moves = {}
+        # Recently moved directories: source path -> (destination path, time of the event)
+        self._dir_moves = {}
+        # Recently uploaded (rel, size, mtime_ns) -> upload time, oldest first
+        self._recent = OrderedDict()
+        self._recent_lock = threading.Lock()
+        # One queue per worker; a path always maps to the same worker so its operations stay ordered
+        self._queues = [queue.Queue() for _ in range(CONCURRENCY)]
+        for q in self._queues:
+            threading.Thread(target=self._worker, args=(q,), daemon=True).start()
 
     def on_modified(self, event):
         if not event.is_directory:
             try:
-                self.upload(Path(event.src_path))
+                self.schedule("upload", event.src_path)
             except Exception as e:
-                print(f"Error handling file modification for {event.src_path}: {e}")
+                logger.error("Error handling file modification for %s: %s", event.src_path, e)
 
     def on_moved(self, event):
         try:
-            rel_source = str(Path(event.src_path).relative_to(LOCAL_DIR))
-            remote_path_source = f"{REMOTE_DIR}/{rel_source}".replace("\\", "/")
-            rel_dest = str(Path(event.dest_path).relative_to(LOCAL_DIR))
-            remote_path_dest = f"{REMOTE_DIR}/{rel_dest}".replace("\\", "/")
-            print(f"Moving {rel_source} to {rel_dest}")
-            self.client.move(remote_path_source, remote_path_dest)
-            print(f"Moved {remote_path_source} to {remote_path_dest}")
+            if not event.is_directory:
+                if event.src_path in IGNORED_PATHS or event.dest_path in IGNORED_PATHS:
+                    # Atomic rewrite of our own bookkeeping files
+                    return
+                with self._lock:
+                    if event.src_path in self._conflict_renames:
+                        self._conflict_renames.discard(event.src_path)
+                        return
+                    pending = self._cancel(event.src_path)
+                if pending and pending[0] == "upload":
+                    # Source was never uploaded in its latest state, upload the destination instead
+                    self.schedule("upload", event.dest_path, created=pending[1])
+                    return
+            with self._lock:
+                if self._is_sub_move(event.src_path, event.dest_path):
+                    # Already moved remotely along with its parent directory
+                    return
+                if event.is_directory:
+                    self._dir_moves[event.src_path] = (event.dest_path, time.monotonic())
+            # Routed by the source, so it runs after operations still queued for it
+            self.enqueue("move", event.src_path, event.src_path, event.dest_path)
         except Exception as e:
-            print(f"Error handling file move for {remote_path_source}: {e}")
+            logger.error("Error handling file move for %s: %s", event.src_path, e)
+
+    def _is_sub_move(self, src, dest):
+        """Whether a move event is one of those generated for the children of a directory move (caller holds _lock)"""
+        now = time.monotonic()
+        for dir_src, (dir_dest, seen) in list(self._dir_moves.items()):
+            if now - seen > SUB_MOVE_SECONDS:
+                del self._dir_moves[dir_src]
+            elif src.startswith(dir_src + os.sep) and dest == dir_dest + src[len(dir_src):]:
+                return True
+        return False
 
     def on_created(self, event):
         if not event.is_directory:
             try:
-                self.upload(Path(event.src_path))
+                self.schedule("upload", event.src_path, created=True)
             except Exception as e:
-                print(f"Error handling file creation for {event.src_path}: {e}")
+                logger.error("Error handling file creation for %s: %s", event.src_path, e)
         else:
             try:
-                rel = str(Path(event.src_path).relative_to(LOCAL_DIR))
-                remote_path = f"{REMOTE_DIR}/{rel}".replace("\\", "/")
-                self.client.mkdir(remote_path)
-                print(f"Created remote directory: {remote_path}")
+                self.enqueue("mkdir", event.src_path, event.src_path)
             except Exception as e:
-                print(f"Error handling directory creation for {event.src_path}: {e}")
+                logger.error("Error handling directory creation for %s: %s", event.src_path, e)
 
     def on_deleted(self, event):
         if not event.is_directory:
             try:
-                rel = str(Path(event.src_path).relative_to(LOCAL_DIR))
-                remote_path = f"{REMOTE_DIR}/{rel}".replace("\\", "/")
-                self.client.clean(remote_path)
-                print(f"Deleted remote: {rel}")
+                self.schedule("delete", event.src_path)
             except Exception as e:
-                print(f"Error handling file deletion for {event.src_path}: {e}")
+                logger.error("Error handling file deletion for %s: %s", event.src_path, e)
+
+    def _rel_path(self, src):
+        return src[self._local_prefix_len:].replace(os.sep, "/")
+
+    def _remote_path(self, src):
+        return f"{REMOTE_DIR}/{self._rel_path(src)}"
+
+    def enqueue(self, op, key, *args):
+        """Hand an operation over to the worker that owns the given path"""
+        with self._lock:
+            # Operations on (or below) the destination of a queued move run on another
+            # worker, they must wait until the move is done
+            waits = [
+                done for dest, done in self._moves.items()
+                if any(path == dest or path.startswith(dest + os.sep) for path in args)
+            ]
+            done = None
+            if op == "move":
+                done = self._moves[args[1]] = threading.Event()
+        self._queues[hash(key) % len(self._queues)].put((op, args, waits, done))
 
-    def upload(self, path: Path):
+    def _worker(self, q):
+        while True:
+            op, args, waits, done = q.get()
+            try:
+                for event in waits:
+                    event.wait()
+                getattr(self, op)(*args)
+            except Exception as e:
+                logger.error("Error running %s for %s: %s", op, args, e)
+            finally:
+                if done is not None:
+                    done.set()
+                    with self._lock:
+                        if self._moves.get(args[1]) is done:
+                            del self._moves[args[1]]
+                q.task_done()
+
+    def schedule(self, op, src_path, created=False):
+        """Debounce an operation so only the last event within the quiet period runs"""
+        if src_path in IGNORED_PATHS:
+            return
+        with self._lock:
+            pending = self._cancel(src_path)
+            if pending:
+                if op == "delete" and pending[1]:
+                    # Created and deleted within the window, nothing to do remotely
+                    logger.info("Skipping short-lived file: %s", src_path)
+                    return
+                # Keep track of whether the file is new since the first event in the burst
+                created = pending[1]
+            entry = (op, created)
+            timer = threading.Timer(DEBOUNCE_SECONDS, self._fire, args=(src_path, entry))
+            timer.daemon = True
+            self._timers[src_path] = timer
+            self._pending[src_path] = entry
+            timer.start()
+
+    def _cancel(self, src_path):
+        """Cancel the pending operation for a path, returning (op, created) if there was one"""
+        timer = self._timers.pop(src_path, None)
+        if timer:
+            timer.cancel()
+        return self._pending.pop(src_path, None)
+
+    def _fire(self, src_path, entry):
+        with self._lock:
+            if self._pending.get(src_path) is not entry:
+                # Superseded by a newer event while this timer was firing
+                return
+            self._timers.pop(src_path, None)
+            self._pending.pop(src_path, None)
+        self.enqueue(entry[0], src_path, src_path)
+
+    # The operations below run on the worker threads, each with its own client
+
+    def move(self, src, dest):
+        try:
+            remote_path_source = self._remote_path(src)
+            remote_path_dest = self._remote_path(dest)
+            logger.info("Moving %s to %s", self._rel_path(src), self._rel_path(dest))
+            get_thread_client(self.config_options).move(remote_path_source, remote_path_dest)
+            self._forget_recent(self._rel_path(src))
+            self._record("move", self._rel_path(src), dest=self._rel_path(dest))
+            logger.info("Moved %s to %s", remote_path_source, remote_path_dest)
+        except RemoteResourceNotFound:
+            if not os.path.isfile(dest):
+                logger.error("Error handling file move for %s: remote file not found", src)
+                return
+            # The source never made it to the server, upload the file under its new name
+            logger.info("Remote %s not found, uploading %s instead", remote_path_source, self._rel_path(dest))
+            self.upload(dest)
+        except Exception as e:
+            logger.error("Error handling file move for %s: %s", src, e)
+
+    def mkdir(self, src):
         try:
-            rel = str(path.relative_to(LOCAL_DIR)).replace("\\", "/")
-            remote_path = f"{REMOTE_DIR}/{rel}"
-            print(f"Uploading {rel} -> {remote_path}")
-            self.client.upload_sync(remote_path=remote_path, local_path=str(path))
-            print(f"Successfully uploaded: {rel}")
+            remote_path = self._remote_path(src)
+            get_thread_client(self.config_options).mkdir(remote_path)
+            self._record("mkdir", self._rel_path(src))
+            logger.info("Created remote directory: %s", remote_path)
         except Exception as e:
-            print(f"Error uploading {path}: {e}")
+            logger.error("Error handling directory creation for %s: %s", src, e)
+
+    def delete(self, src):
+        try:
+            rel = self._rel_path(src)
+            get_thread_client(self.config_options).clean(self._remote_path(src))
+            self._forget_recent(rel)
+            self._record("delete", rel)
+            logger.info("Deleted remote: %s", rel)
+        except Exception as e:
+            logger.error("Error deleting remote file for %s: %s", src, e)
+
+    def upload(self, src):
+        try:
+            path = Path(src)
+            rel = self._rel_path(src)
+            local_stat = path.stat()
+            key = (rel, local_stat.st_size, local_stat.st_mtime_ns)
+            now = time.monotonic()
+            with self._recent_lock:
+                if self._recent.get(key, 0) > now - RECENT_UPLOAD_SECONDS:
+                    logger.info("Skipping (just uploaded): %s", rel)
+                    return
+            # Hash the content that goes with this stat, before sending it
+            digest = hash_file(src, local_stat.st_size)
+            remote_path = self._remote_path(src)
+            logger.info("Uploading %s -> %s", rel, remote_path)
+            client = get_thread_client(self.config_options)
+            if local_stat.st_size > CHUNKED_UPLOAD_THRESHOLD:
+                parent = Urn(remote_path).parent()
+                if not client.check(parent):
+                    client.mkdir(parent, recursive=True)
+                etag = chunked_upload(client, remote_path, path, self.index, rel)
+            else:
+                # Only overwrite the remote file if nobody changed it since we last saw it
+                with _index_lock:
+                    cached_etag = self.index["files"].get(rel, {}).get("etag")
+                try:
+                    etag = put_file(client, remote_path, src, if_match=cached_etag)
+                except ResponseErrorCode as e:
+                    if e.code == 409:
+                        # Missing parent, its mkdir may still be queued on another worker
+                        client.mkdir(Urn(remote_path).parent(), recursive=True)
+                        etag = put_file(client, remote_path, src)
+                    elif e.code == 412:
+                        etag = self.resolve_conflict(client, src, cached_etag)
+                        if etag is None:
+                            return
+                    else:
+                        raise
+            after = os.stat(src)
+            if (after.st_size, after.st_mtime_ns) != (local_stat.st_size, local_stat.st_mtime_ns):
+                # Changed while uploading, the remote content is unknown; its modify event uploads it again
+                digest = None
+            self._record(
+                "upload", rel,
+                dev=local_stat.st_dev,
+                ino=local_stat.st_ino,
+                size=local_stat.st_size,
+                mtime_ns=local_stat.st_mtime_ns,
+                xxh3=digest,
+                etag=etag,
+            )
+            # Timed from the end of the upload, so modify events queued behind a long PUT are still covered
+            self._remember_upload(key)
+            logger.info("Successfully uploaded: %s", rel)
+        except Exception as e:
+            logger.error("Error uploading %s: %s", src, e)
             # Don't re-raise - we want to continue monitoring other files
 
+    def resolve_conflict(self, client, src, cached_etag):
+        """Handle a refused conditional upload; return the new ETag, or None if the file was kept as a conflict copy"""
+        rel = self._rel_path(src)
+        remote_path = self._remote_path(src)
+        try:
+            remote_etag = normalize_etag(client.info(remote_path).get("etag"))
+        except RemoteResourceNotFound:
+            # Deleted by another client, nothing to overwrite
+            remote_etag = cached_etag
+        if remote_etag == cached_etag:
+            # Weak ETags never satisfy If-Match although the remote file is the one we last saw
+            return put_file(client, remote_path, src)
+
+        # Keep both versions: the local one is renamed and uploaded next to the remote file,
+        # which is then downloaded in its place
+        conflict_src = f"{src}.CONFLICT"
+        n = 1
+        while os.path.lexists(conflict_src):
+            # Don't overwrite the copy kept by an earlier conflict
+            conflict_src = f"{src}.CONFLICT-{n}"
+            n += 1
+        conflict_rel = self._rel_path(conflict_src)
+        logger.warning("Remote %s was changed by another client, keeping the local version as %s", rel, conflict_rel)
+        with self._lock:
+            self._cancel(src)
+            self._conflict_renames.add(src)
+        os.replace(src, conflict_src)
+        local_stat = os.stat(conflict_src)
+        digest = hash_file(conflict_src, local_stat.st_size)
+        etag = put_file(client, self._remote_path(conflict_src), conflict_src)
+        # Our version of the file now lives under the conflict name
+        self._record("move", rel, dest=conflict_rel)
+        self._record(
+            "upload", conflict_rel,
+            dev=local_stat.st_dev,
+            ino=local_stat.st_ino,
+            size=local_stat.st_size,
+            mtime_ns=local_stat.st_mtime_ns,
+            xxh3=digest,
+            etag=etag,
+        )
+
+        etag, digest = get_file(client, remote_path, src)
+        local_stat = os.stat(src)
+        self._record(
+            "download", rel,
+            dev=local_stat.st_dev,
+            ino=local_stat.st_ino,
+            size=local_stat.st_size,
+            mtime_ns=local_stat.st_mtime_ns,
+            xxh3=digest,
+            etag=etag,
+        )
+        # The events of writing the download must not upload it straight back
+        self._remember_upload((rel, local_stat.st_size, local_stat.st_mtime_ns))
+        logger.info("Downloaded the remote version of %s", rel)
+        return None
+
+    def _record(self, op, rel, **fields):
+        """Journal a completed remote operation and apply it to the in-memory index"""
+        append_journal(op, rel, **fields)
+        with _index_lock:
+            apply_journal_record(self.index, op, rel, fields)
+
+    def _remember_upload(self, key):
+        """Record (rel, size, mtime_ns) as just uploaded"""
+        with self._recent_lock:
+            self._recent[key] = time.monotonic()
+            self._recent.move_to_end(key)
+            if len(self._recent) > RECENT_UPLOAD_MAX:
+                self._recent.popitem(last=False)
+
+    def _forget_recent(self, rel):
+        """Drop recent uploads of a path that no longer exists remotely"""
+        with self._recent_lock:
+            for key in [key for key in self._recent if key[0] == rel]:
+                del self._recent[key]
+
+    def close(self):
+        """Drop pending debounced events, finish queued operations and compact the journal"""
+        with self._lock:
+            for src_path in list(self._timers):
+                # Anything dropped here shows up as a local change on the next startup
+                self._cancel(src_path)
+        for q in self._queues:
+            q.join()
+        compact_journal(self.index)
+
+# --- Remote Listing -----------------------------------------------------------
+def list_remote_tree(client):
+    """List all remote files, directories, file mtimes and etags below REMOTE_DIR with a single Depth: infinity PROPFIND"""
+    url = client.get_url(Urn(REMOTE_DIR, directory=True).quote())
+    response = client.session.request(
+        "PROPFIND",
+        url,
+        auth=(client.webdav.login, client.webdav.password),
+        headers={"Depth": "infinity", "Content-Type": "application/xml"},
+        data=PROPFIND_BODY,
+        timeout=client.timeout,
+        verify=client.verify,
+        stream=True,
+    )
+    if response.status_code == 403:
+        # Some servers refuse infinite depth, walk the tree one level at a time instead
+        response.close()
+        logger.info("Server refused Depth: infinity listing, falling back to recursive listing")
+        return list_remote_recursive(client)
+    response.raise_for_status()
+
+    remote_files = set()
+    remote_dirs = set()
+    remote_mtimes = {}
+    remote_etags = {}
+    base = unquote(urlparse(url).path).rstrip("/")
+    response.raw.decode_content = True
+    with response:
+        for _, elem in ET.iterparse(response.raw):
+            if elem.tag != "{DAV:}response":
+                continue
+            href = elem.findtext("{DAV:}href", "")
+            path = unquote(urlparse(href).path)
+            rel_path = path[len(base) + 1:].strip("/") if path.startswith(base + "/") else ""
+            if rel_path:
+                if elem.find(".//{DAV:}resourcetype/{DAV:}collection") is not None:
+                    remote_dirs.add(rel_path)
+                else:
+                    remote_files.add(rel_path)
+                    modified = elem.findtext(".//{DAV:}getlastmodified")
+                    if modified:
+                        remote_mtimes[rel_path] = parse_http_date(modified)
+                    etag = normalize_etag(elem.findtext(".//{DAV:}getetag"))
+                    if etag:
+                        remote_etags[rel_path] = etag
+            elem.clear()
+    return remote_files, remote_dirs, remote_mtimes, remote_etags
+
+def list_remote_recursive(client):
+    """List all remote files and directories below REMOTE_DIR one PROPFIND per directory (no mtimes or etags)"""
+    remote_files = set()
+    remote_dirs = set()
+
+    def walk(path):
+        try:
+            items = client.list(path)
+            for item in items:
+                if item.endswith('/'):
+                    # Directory
+                    dir_name = item.rstrip('/').split('/')[-1]
+                    if dir_name:  # Skip root path
+                        rel_path = path.replace(REMOTE_DIR, '').lstrip('/')
+                        if rel_path:
+                            remote_dirs.add(f"{rel_path}/{dir_name}")
+                        else:
+                            remote_dirs.add(dir_name)
+                        # Recursively list subdirectories
+                        walk(f"{path}/{dir_name}")
+                else:
+                    # File
+                    rel_path = path.replace(REMOTE_DIR, '').lstrip('/')
+                    if rel_path:
+                        remote_files.add(f"{rel_path}/{item}")
+                    else:
+                        remote_files.add(item)
+        except Exception as e:
+            logger.warning("Could not list remote directory %s: %s", path, e)
+
+    walk(REMOTE_DIR)
+    return remote_files, remote_dirs, {}, {}
+
+# --- Async Transfers ----------------------------------------------------------
+async def run_concurrently(client, coroutine_fn, items):
+    """Await coroutine_fn(session, item) for every item, at most ASYNC_CONCURRENCY at a time.
+
+    All requests share one aiohttp session, so a single thread drives every
+    transfer. Returns the number of calls that returned True.
+    """
+    semaphore = asyncio.Semaphore(ASYNC_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=ASYNC_CONCURRENCY)
+    auth = aiohttp.BasicAuth(client.webdav.login, client.webdav.password)
+    timeout = aiohttp.ClientTimeout(sock_connect=client.timeout, sock_read=client.timeout)
+
+    async with aiohttp.ClientSession(connector=connector, auth=auth, timeout=timeout) as session:
+        async def bounded(item):
+            async with semaphore:
+                return await coroutine_fn(session, item)
+
+        done = 0
+        for result in asyncio.as_completed([bounded(item) for item in items]):
+            done += bool(await result)
+        return done
+
+async def request_with_retries(session, method, url, local_path=None, retries=3):
+    """Send a request (streaming local_path as the body), retrying 502/503/504 and connection errors"""
+    for attempt in range(retries + 1):
+        body = open(local_path, "rb") if local_path is not None else None
+        try:
+            async with session.request(method, url, data=body) as response:
+                if response.status not in (502, 503, 504) or attempt == retries:
+                    response.raise_for_status()
+                    return response
+        except aiohttp.ClientConnectionError:
+            if attempt == retries:
+                raise
+        finally:
+            if body is not None:
+                body.close()
+        # Same exponential backoff as the requests adapter: 1s, 2s, 4s
+        await asyncio.sleep(2 ** attempt)
+
+# --- Local Listing ------------------------------------------------------------
+def scan_local_tree():
+    """Walk LOCAL_DIR with os.scandir, returning ({rel_path: stat_result}, {rel_dir}, {unscanned rel_path})
+
+    The stat result comes from the DirEntry, so files are not stat'ed a second time later.
+    Entries that could not be stat'ed and directories that could not be listed ("" for
+    LOCAL_DIR itself) end up in the unscanned set, their remote counterparts must be left alone.
+    """
+    local_meta = {}
+    local_dirs = set()
+    unscanned = set()
+
+    def scan(path, prefix):
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    rel_path = prefix + entry.name
+                    try:
+                        is_dir = entry.is_dir()
+                        if not is_dir and entry.path not in IGNORED_PATHS:
+                            local_meta[rel_path] = entry.stat()
+                    except OSError as e:
+                        # Dangling symlink, or deleted between listing and stat
+                        logger.warning("Could not stat local file %s: %s", entry.path, e)
+                        unscanned.add(rel_path)
+                        continue
+                    if is_dir:
+                        local_dirs.add(rel_path)
+                        # Like os.walk, don't descend into symlinked directories
+                        if not entry.is_symlink():
+                            scan(entry.path, rel_path + "/")
+        except OSError as e:
+            logger.warning("Could not scan local directory %s: %s", path, e)
+            unscanned.add(prefix.rstrip("/"))
+
+    scan(str(LOCAL_DIR), "")
+    return local_meta, local_dirs, unscanned
+
 # --- Startup Sync -------------------------------------------------------------
-def startup_sync(client):
+def startup_sync(client, config_options):
     """Perform initial sync: upload local files to remote and delete remote files not present locally"""
-    print("Starting initial sync...")
+    logger.info("Starting initial sync...")
     
-    # Get list of all local files and directories
-    local_files = set()
-    local_dirs = set()
+    # State recorded by the previous run, including operations journaled after the last compaction
+    index = load_index()
+    replay_journal(index)
+    files = index["files"]
     
-    for root, dirs, files in os.walk(LOCAL_DIR):
-        root_path = Path(root)
-        for file in files:
-            rel_path = str(root_path.joinpath(file).relative_to(LOCAL_DIR)).replace("\\", "/")
-            local_files.add(rel_path)
-        for dir_name in dirs:
-            rel_path = str(root_path.joinpath(dir_name).relative_to(LOCAL_DIR)).replace("\\", "/")
-            local_dirs.add(rel_path)
+    # Get list of all local files (with their stat results) and directories
+    local_meta, local_dirs, unscanned = scan_local_tree()
+    local_files = set(local_meta)
+
+    def is_scanned(rel):
+        """Whether the local scan covered rel, so its absence locally means it was deleted"""
+        while rel not in unscanned:
+            if not rel:
+                return True
+            rel = rel.rpartition("/")[0]
+        return False
     
-    print(f"Found {len(local_files)} local files and {len(local_dirs)} local directories")
+    logger.info("Found %s local files and %s local directories", len(local_files), len(local_dirs))
     
     # Get list of all remote files and directories
     remote_files = set()
     remote_dirs = set()
+    remote_mtimes = {}
+    remote_etags = {}
+    remote_listed = False
     
-    try:
-        def list_remote_recursive(path):
-            try:
-                items = client.list(path)
-                for item in items:
-                    if item.endswith('/'):
-                        # Directory
-                        dir_name = item.rstrip('/').split('/')[-1]
-                        if dir_name:  # Skip root path
-                            rel_path = path.replace(REMOTE_DIR, '').lstrip('/')
-                            if rel_path:
-                                remote_dirs.add(f"{rel_path}/{dir_name}")
-                            else:
-                                remote_dirs.add(dir_name)
-                            # Recursively list subdirectories
-                            list_remote_recursive(f"{path}/{dir_name}")
-                    else:
-                        # File
-                        rel_path = path.replace(REMOTE_DIR, '').lstrip('/')
-                        if rel_path:
-                            remote_files.add(f"{rel_path}/{item}")
-                        else:
-                            remote_files.add(item)
-            except Exception as e:
-                print(f"Warning: Could not list remote directory {path}: {e}")
-        
-        list_remote_recursive(REMOTE_DIR)
-        print(f"Found {len(remote_files)} remote files and {len(remote_dirs)} remote directories")
-        
-    except Exception as e:
-        print(f"Warning: Could not list remote files: {e}")
-        print("Proceeding with upload only...")
+    if index["complete"] and not FULL_SYNC:
+        # The index mirrors the remote tree: only look at files changed locally since then
+        remote_files = {rel for rel, entry in files.items() if "size" in entry}
+        remote_dirs = set(index["dirs"])
+        remote_listed = True
+        candidates = {
+            rel for rel, local_stat in local_meta.items()
+            if (local_stat.st_size, local_stat.st_mtime_ns)
+            != (files.get(rel, {}).get("size"), files.get(rel, {}).get("mtime_ns"))
+        }
+        logger.info("Incremental sync: %s new or changed local files", len(candidates))
+    else:
+        candidates = local_files
+        try:
+            remote_files, remote_dirs, remote_mtimes, remote_etags = list_remote_tree(client)
+            remote_listed = True
+            logger.info("Found %s remote files and %s remote directories", len(remote_files), len(remote_dirs))
+            
+        except Exception as e:
+            logger.warning("Could not list remote files: %s", e)
+            logger.info("Proceeding with upload only...")
     
     # Delete remote files that don't exist locally
-    deleted_count = 0
-    for remote_file in remote_files:
-        if remote_file not in local_files:
-            try:
-                remote_path = f"{REMOTE_DIR}/{remote_file}"
-                print(f"Deleting remote file (not in local): {remote_file}")
-                client.clean(remote_path)
-                deleted_count += 1
-            except Exception as e:
-                print(f"Error deleting remote file {remote_file}: {e}")
+    async def delete_remote_file(session, remote_file):
+        try:
+            remote_path = f"{REMOTE_DIR}/{remote_file}"
+            logger.info("Deleting remote file (not in local): %s", remote_file)
+            await request_with_retries(session, "DELETE", client.get_url(Urn(remote_path).quote()))
+            return True
+        except Exception as e:
+            logger.error("Error deleting remote file %s: %s", remote_file, e)
+            return False
+
+    stale_files = {rel for rel in remote_files - local_files if is_scanned(rel)}
+    deleted_count = asyncio.run(run_concurrently(client, delete_remote_file, stale_files))
+    # Remote operations that failed mean the index can't be trusted as a mirror next time
+    failed = len(stale_files) - deleted_count
     
-    print(f"Deleted {deleted_count} remote files")
+    logger.info("Deleted %s remote files", deleted_count)
     
     # Delete remote directories that don't exist locally
     deleted_dirs = 0
     for remote_dir in sorted(remote_dirs, key=len, reverse=True):  # Delete deepest dirs first
-        if remote_dir not in local_dirs:
+        if remote_dir not in local_dirs and is_scanned(remote_dir):
             try:
                 remote_path = f"{REMOTE_DIR}/{remote_dir}"
-                print(f"Deleting remote directory (not in local): {remote_dir}")
+                logger.info("Deleting remote directory (not in local): %s", remote_dir)
                 client.clean(remote_path)
                 deleted_dirs += 1
             except Exception as e:
-                print(f"Error deleting remote directory {remote_dir}: {e}")
+                logger.error("Error deleting remote directory %s: %s", remote_dir, e)
+                failed += 1
     
-    print(f"Deleted {deleted_dirs} remote directories")
+    logger.info("Deleted %s remote directories", deleted_dirs)
     
-    # Create remote directories that don't exist
-    created_dirs = 0
-    for local_dir in local_dirs:
+    # Create remote directories that don't exist, one depth level at a time so parents exist first
+    def create_remote_dir(local_dir):
         try:
             remote_path = f"{REMOTE_DIR}/{local_dir}"
-            client.mkdir(remote_path)
-            created_dirs += 1
+            # Plain MKCOL: the parent was created in an earlier level, no need for mkdir's existence check
+            get_thread_client(config_options).execute_request(
+                action="mkdir", path=Urn(remote_path, directory=True).quote()
+            )
+            return True
+        except MethodNotSupported:
+            # 405: directory already exists (the remote listing may have failed)
+            return True
         except Exception as e:
-            # Directory might already exist
-            pass
+            logger.error("Error creating remote directory %s: %s", local_dir, e)
+            return False
+
+    missing_dirs = sorted(local_dirs - remote_dirs, key=lambda p: p.count("/"))
+    created_dirs = 0
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        for _, level in groupby(missing_dirs, key=lambda p: p.count("/")):
+            created_dirs += sum(executor.map(create_remote_dir, list(level)))
+    failed += len(missing_dirs) - created_dirs
     
-    print(f"Created {created_dirs} remote directories")
+    logger.info("Created %s remote directories", created_dirs)
 
-    # Upload local files that don't exist remotely or are newer
-    uploaded_count = 0
-    for local_file in local_files:
-        try:
-            local_path = LOCAL_DIR / local_file
-            remote_path = f"{REMOTE_DIR}/{local_file}"
-            
-            # Check if remote file exists and compare modification times
-            should_upload = True
+    # Hashes of files whose (dev, inode, size, mtime) is unchanged since they were recorded, even under another name
+    known_hashes = {
+        (entry["dev"], entry["ino"], entry["size"], entry["mtime_ns"]): entry["xxh3"]
+        for entry in files.values()
+        if entry.get("ino") and entry.get("xxh3")
+    }
+
+    # Upload local files that don't exist remotely or are newer and whose content changed
+    def plan_upload(rel):
+        """Return the content hash of a file that needs uploading, or None to skip it (runs on a thread)"""
+        local_path = LOCAL_DIR / rel
+        remote_path = f"{REMOTE_DIR}/{rel}"
+        local_stat = local_meta[rel]
+
+        with _index_lock:
+            partial = files.get(rel, {}).get("partial")
+        if partial and partial["size"] == local_stat.st_size and partial["mtime_ns"] == local_stat.st_mtime_ns:
+            # Interrupted chunked upload: the remote file is incomplete even if its mtime is newer
+            logger.info("Resuming interrupted upload: %s", rel)
+            return hash_file(local_path, local_stat.st_size)
+
+        # Check if remote file exists and compare modification times
+        remote_mtime = remote_mtimes.get(rel)
+        remote_etag = remote_etags.get(rel)
+        if remote_mtime is None and (not remote_listed or rel in remote_files):
+            # Not covered by the listing, ask the server directly
             try:
-                remote_info = client.info(remote_path)
-                if remote_info:
-                    # File exists remotely, check if local is newer
-                    local_mtime = local_path.stat().st_mtime
-                    remote_mtime = float(remote_info.get('modified', 0))
-                    if local_mtime <= remote_mtime:
-                        should_upload = False
-            except:
+                remote_info = get_thread_client(config_options).info(remote_path)
+                if remote_info and remote_info.get('modified'):
+                    remote_mtime = parse_http_date(remote_info['modified'])
+                    remote_etag = normalize_etag(remote_info.get('etag'))
+            except Exception:
                 # Remote file doesn't exist or can't get info
                 pass
-            
-            if should_upload:
-                print(f"Uploading: {local_file}")
-                client.upload_sync(remote_path=remote_path, local_path=str(local_path))
-                uploaded_count += 1
+        if remote_mtime is not None and local_stat.st_mtime <= remote_mtime:
+            # File exists remotely and local is not newer
+            with _index_lock:
+                entry = files.get(rel, {})
+                files[rel] = {
+                    "size": local_stat.st_size,
+                    "mtime_ns": local_stat.st_mtime_ns,
+                    # The hash describes the remote content, only valid while the etag is unchanged
+                    "xxh3": entry.get("xxh3") if entry.get("etag") == remote_etag else None,
+                    "etag": remote_etag,
+                }
+                if "partial" in entry:
+                    # Resume offset of another version of the file, chunked_upload checks it still applies
+                    files[rel]["partial"] = entry["partial"]
+            logger.info("Skipping (up to date): %s", rel)
+            return None
+
+        # Newer mtime but same bytes as our last upload, and remote untouched since then
+        digest = None
+        if local_stat.st_ino:
+            # st_ino is 0 where DirEntry doesn't provide it (Windows)
+            digest = known_hashes.get(
+                (local_stat.st_dev, local_stat.st_ino, local_stat.st_size, local_stat.st_mtime_ns)
+            )
+        if digest is None:
+            digest = hash_file(local_path, local_stat.st_size)
+        with _index_lock:
+            entry = files.get(rel)
+            if entry and entry.get("etag") and entry["etag"] == remote_etag \
+                    and entry.get("size") == local_stat.st_size and entry.get("xxh3") == digest:
+                entry.update(dev=local_stat.st_dev, ino=local_stat.st_ino, mtime_ns=local_stat.st_mtime_ns)
+                logger.info("Skipping (content unchanged): %s", rel)
+                return None
+        return digest
+
+    async def upload_if_newer(session, rel):
+        loop = asyncio.get_running_loop()
+        local_path = LOCAL_DIR / rel
+        remote_path = f"{REMOTE_DIR}/{rel}"
+        try:
+            # Hashing and the rare info() fallback block, keep them off the event loop
+            digest = await loop.run_in_executor(executor, plan_upload, rel)
+            if digest is None:
+                return False
+
+            logger.info("Uploading: %s", rel)
+            local_stat = local_meta[rel]
+            if local_stat.st_size > CHUNKED_UPLOAD_THRESHOLD:
+                # Large files keep their resumable ranged upload on a worker thread
+                etag = await loop.run_in_executor(
+                    executor,
+                    lambda: chunked_upload(get_thread_client(config_options), remote_path, local_path, index, rel),
+                )
             else:
-                print(f"Skipping (up to date): {local_file}")
-                
+                response = await request_with_retries(
+                    session, "PUT", client.get_url(Urn(remote_path).quote()), local_path=local_path
+                )
+                etag = response.headers.get("ETag")
+                if not etag:
+                    etag = await loop.run_in_executor(
+                        executor, lambda: get_thread_client(config_options).info(remote_path).get("etag")
+                    )
+                etag = normalize_etag(etag)
+            with _index_lock:
+                files[rel] = {
+                    "dev": local_stat.st_dev,
+                    "ino": local_stat.st_ino,
+                    "size": local_stat.st_size,
+                    "mtime_ns": local_stat.st_mtime_ns,
+                    "xxh3": digest,
+                    "etag": etag,
+                }
+            return True
         except Exception as e:
-            print(f"Error uploading {local_file}: {e}")
+            logger.error("Error uploading %s: %s", rel, e)
+            return False
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        uploaded_count = asyncio.run(run_concurrently(client, upload_if_newer, candidates))
     
-    print(f"Uploaded {uploaded_count} files")
+    logger.info("Uploaded %s files", uploaded_count)
+
+    # Record the synced state; files that failed to upload keep their old entry and count as changed next time
+    with _index_lock:
+        index["files"] = {rel: entry for rel, entry in files.items() if rel in local_files or not is_scanned(rel)}
+        index["dirs"] = local_dirs
+        index["complete"] = remote_listed and not failed and not unscanned
+    try:
+        compact_journal(index)
+    except Exception as e:
+        logger.warning("Could not write sync index %s: %s", INDEX_FILE, e)
     
-    print("Initial sync completed!")
+    logger.info("Initial sync completed!")
 
 # --- Main Sync Loop ----------------------------------------------------------
 def main():
+    log_listener = setup_logging()
     try:
         config_options = load_config()
         client = create_webdav_client(config_options)
 
-        print(f"Local directory: {LOCAL_DIR}")
-        print(f"Remote directory: {REMOTE_DIR}")
+        logger.info("Local directory: %s", LOCAL_DIR)
+        logger.info("Remote directory: %s", REMOTE_DIR)
         
         LOCAL_DIR.mkdir(exist_ok=True)
         
         # Ensure remote base directory exists
         try:
-            print(f"Ensuring remote directory exists: {REMOTE_DIR}")
+            logger.info("Ensuring remote directory exists: %s", REMOTE_DIR)
             client.mkdir(REMOTE_DIR)
         except Exception as e:
-            print(f"Warning: Could not create remote directory {REMOTE_DIR}: {e}")
-            print("This might be normal if the directory already exists or if you don't have write permissions")
+            logger.warning("Could not create remote directory %s: %s", REMOTE_DIR, e)
+            logger.info("This might be normal if the directory already exists or if you don't have write permissions")
 
         # Perform initial sync
-        startup_sync(client)
+        startup_sync(client, config_options)
 
         # Start local watcher
-        handler = LocalHandler(client)
-        obs = Observer()
+        handler = LocalHandler(config_options)
+        if Observer.__name__ == "PollingObserver":
+            logger.warning("Native file system events are unavailable, falling back to polling")
+            obs = Observer()
+        else:
+            obs = Observer(timeout=OBSERVER_TIMEOUT)
+        check_inotify_limit()
         obs.schedule(handler, str(LOCAL_DIR), recursive=True)
         obs.start()
 
-        print("Starting file sync (Ctrl+C to stop)...")
-        try:
-            while True:
-                time.sleep(30)
-        except KeyboardInterrupt:
-            print("\nStopping sync...")
+        stopping = []
+
+        def stop(signum, frame):
+            if stopping:
+                # Second signal: exit without waiting for queued operations
+                raise KeyboardInterrupt
+            stopping.append(signum)
+            logger.info("Stopping sync...")
             obs.stop()
+
+        # Ctrl+C and SIGTERM stop the observer; until then the main thread just waits on it
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        logger.info("Starting file sync (Ctrl+C to stop)...")
+        try:
+            # Join with a timeout so signals are also handled where a blocking join can't be interrupted (Windows)
+            while obs.is_alive():
+                obs.join(1)
         finally:
-            obs.join()
-            print("Sync stopped.")
+            handler.close()
+            logger.info("Sync stopped.")
             
+    except KeyboardInterrupt:
+        logger.warning("Sync interrupted")
+        return 1
     except Exception as e:
-        print(f"Fatal error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Fatal error: %s", e)
         return 1
+    finally:
+        log_listener.stop()
     
     return 0
 